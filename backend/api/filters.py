@@ -1,6 +1,7 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Recipe, Ingredient, Favorite, ShoppingCart
+from recipes.models import Recipe, Ingredient
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -20,27 +21,25 @@ class RecipeFilter(django_filters.FilterSet):
         """Фильтр по тегам."""
         tags_slugs = self.request.GET.getlist('tags')
         if tags_slugs:
-            return queryset.filter(tags__slug__in=tags_slugs).distinct()
+            return queryset.filter(
+                Exists(
+                    Recipe.tags.through.objects.filter(
+                        recipe_id=OuterRef('pk'), tag__slug__in=tags_slugs
+                    )
+                )
+            )
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
-        """Фильтр по избранному."""
+        """Фильтр по избранному через аннотацию is_favorited."""
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                id__in=Favorite.objects.filter(
-                    user=self.request.user
-                ).values('recipe_id')
-            )
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        """Фильтр по списку покупок."""
+        """Фильтр по списку покупок через аннотацию is_in_shopping_cart."""
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                id__in=ShoppingCart.objects.filter(
-                    user=self.request.user
-                ).values('recipe_id')
-            )
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
 
@@ -1,9 +1,56 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
 
-from foodgram.constants import PAGE_SIZE
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from foodgram.constants import (
+    PAGE_COUNT_CACHE_TIMEOUT, PAGE_SIZE, PAGE_SIZE_QUERY_PARAM
+)
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, кэширующий количество объектов по SQL запроса."""
+
+    refresh_count = False
+
+    @cached_property
+    def count(self):
+        if self.refresh_count:
+            return super().count
+        try:
+            sql = str(self.object_list.query)
+        except (AttributeError, EmptyResultSet):
+            return super().count
+        key = 'page-count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, PAGE_COUNT_CACHE_TIMEOUT)
+        return count
 
 
 class FoodgramPagination(PageNumberPagination):
     """Кастомная пагинация для Foodgram."""
     page_size = PAGE_SIZE
-    page_size_query_param = 'limit'
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+
+
+class RecipePagination(FoodgramPagination):
+    """Пагинация рецептов с кэшированием количества объектов."""
+    django_paginator_class = CachedCountPaginator
+
+    def get_page_number(self, request, paginator):
+        """Первая страница считает количество заново, не трогая кэш."""
+        page_number = super().get_page_number(request, paginator)
+        paginator.refresh_count = str(page_number) == '1'
+        return page_number
+
+
+class FoodgramCursorPagination(CursorPagination):
+    """Курсорная пагинация для больших списков рецептов."""
+    page_size = PAGE_SIZE
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+    ordering = ('-pub_date', '-id')
@@ -1,6 +1,9 @@
 from rest_framework import permissions
 
 
+PUBLIC_USER_ACTIONS = frozenset(('create', 'list', 'retrieve'))
+
+
 class RecipePermission(permissions.BasePermission):
     """Разрешение для рецептов."""
 
@@ -8,13 +11,13 @@ class RecipePermission(permissions.BasePermission):
         return (
             request.method in permissions.SAFE_METHODS
             or request.method == 'POST' and request.user.is_authenticated
-            or request.method not in ['POST']
+            or request.method != 'POST'
         )
 
     def has_object_permission(self, request, view, obj):
         return (
             request.method in permissions.SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.id
         )
 
 
@@ -23,6 +26,6 @@ class UserPermission(permissions.BasePermission):
 
     def has_permission(self, request, view):
         return (
-            view.action in ['create', 'list', 'retrieve']
+            view.action in PUBLIC_USER_ACTIONS
             or request.user.is_authenticated
         )
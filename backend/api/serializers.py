@@ -1,10 +1,21 @@
-import base64
-import uuid
+import binascii
+import re
+import secrets
+from collections.abc import Mapping
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, prefetch_related_objects
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from foodgram.constants import (
+    BASE64_DECODE_CHUNK_SIZE, BULK_BATCH_SIZE, MAX_PK_VALUE
+)
 from recipes.models import (
     Ingredient, Recipe, RecipeIngredient, Tag, Favorite, ShoppingCart
 )
@@ -13,17 +24,87 @@ from users.models import Follow
 
 User = get_user_model()
 
+BASE64_IMAGE_HEADER = re.compile(r'data:image/([\w.+-]{1,16});base64,')
+NON_BASE64_CHARS = re.compile(r'[^A-Za-z0-9+/=]')
+
+
+def get_recipes_limit(request):
+    """Возвращает recipes_limit из запроса, некорректный лимит — None."""
+    if request is None:
+        return None
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
 
 class Base64ImageField(serializers.ImageField):
     """Сериализатор для конвертации изображения в нужный формат."""
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            file_name = f"{uuid.uuid4()}.{ext}"
-            data = ContentFile(base64.b64decode(imgstr), name=file_name)
+        if isinstance(data, str) and data.startswith('data:image/'):
+            header = BASE64_IMAGE_HEADER.match(data)
+            if header is None:
+                raise serializers.ValidationError('Некорректное изображение.')
+            ext = header.group(1)
+            start = header.end()
+            name = f"{secrets.token_hex(8)}.{ext}"
+            try:
+                if len(data) - start > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+                    data = self._decode_to_temporary_file(
+                        data, start, name, f'image/{ext}'
+                    )
+                else:
+                    data = ContentFile(
+                        binascii.a2b_base64(data[start:]), name=name
+                    )
+            except binascii.Error:
+                raise serializers.ValidationError('Некорректное изображение.')
         return super().to_internal_value(data)
 
+    @staticmethod
+    def _decode_to_temporary_file(data, start, name, content_type):
+        """Декодирует большое изображение на диск по частям."""
+        upload = TemporaryUploadedFile(name, content_type, 0, None)
+        pending = ''
+        try:
+            for offset in range(start, len(data), BASE64_DECODE_CHUNK_SIZE):
+                pending += NON_BASE64_CHARS.sub(
+                    '', data[offset:offset + BASE64_DECODE_CHUNK_SIZE]
+                )
+                # a2b_base64 декодирует только полные группы по 4 символа,
+                # поэтому остаток переносится в следующую часть.
+                ready = len(pending) - len(pending) % 4
+                upload.write(binascii.a2b_base64(pending[:ready]))
+                pending = pending[ready:]
+            if pending:
+                upload.write(binascii.a2b_base64(pending))
+        except binascii.Error:
+            upload.close()
+            raise
+        upload.size = upload.tell()
+        upload.seek(0)
+        return upload
+
+
+class ImageUrlField(serializers.ImageField):
+    """Адрес изображения, собранный из базового адреса в контексте."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        base_uri = self.context.get('base_uri')
+        if base_uri is None:
+            return super().to_representation(value) or ''
+        if not value:
+            return ''
+        url = value.url
+        if not url.startswith('/'):
+            return url
+        return f'{base_uri}{url}'
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения информации о пользователе."""
@@ -39,13 +120,16 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        """Проверка, подписан ли текущий пользователь на данного автора."""
-        request = self.context.get('request')
-        return bool(
-            request
-            and request.user.is_authenticated
-            and Follow.objects.filter(user=request.user, author=obj).exists()
-        )
+        """Берёт подписку из аннотации запроса."""
+        return getattr(obj, 'is_subscribed', False)
+
+    def to_representation(self, instance):
+        """Кэширует представление пользователя в пределах запроса."""
+        cache = self.context.setdefault('_user_cache', {})
+        key = (type(self), instance.pk)
+        if key not in cache:
+            cache[key] = super().to_representation(instance)
+        return cache[key]
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -64,10 +148,32 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле, берущее объекты из заранее загруженного словаря контекста."""
+
+    def __init__(self, **kwargs):
+        self.context_key = kwargs.pop('context_key')
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        objects = self.context.get(self.context_key)
+        if objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return objects[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов при записи рецепта."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = PreloadedPrimaryKeyRelatedField(
+        queryset=Ingredient.objects.all(),
+        context_key='ingredients_by_id'
+    )
 
     class Meta:
         model = RecipeIngredient
@@ -96,9 +202,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientReadSerializer(
         source='recipe_ingredients', many=True, read_only=True
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-    image = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+    image = ImageUrlField()
 
     class Meta:
         model = Recipe
@@ -107,30 +213,6 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
         )
 
-    def get_is_favorited(self, obj):
-        """Проверка, добавлен ли рецепт в избранное."""
-        request = self.context.get('request')
-        return bool(
-            request
-            and request.user.is_authenticated
-            and obj.favorites.filter(user=request.user).exists()
-        )
-
-    def get_is_in_shopping_cart(self, obj):
-        """Проверка, добавлен ли рецепт в список покупок."""
-        request = self.context.get('request')
-        return bool(
-            request
-            and request.user.is_authenticated
-            and obj.shopping_cart.filter(user=request.user).exists()
-        )
-
-    def get_image(self, obj):
-        """Всегда возвращает строку с URL изображения."""
-        if obj.image:
-            return self.context['request'].build_absolute_uri(obj.image.url)
-        return ""
-
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
@@ -141,8 +223,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         allow_empty=False,
         required=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = PreloadedPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
+        context_key='tags_by_id',
         many=True,
         write_only=True,
         allow_empty=False,
@@ -159,6 +242,55 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'ingredients', 'tags', 'name', 'image', 'text', 'cooking_time'
         )
 
+    @staticmethod
+    def _collect_ids(values):
+        """Собирает корректные целочисленные идентификаторы из запроса."""
+        ids = set()
+        if not isinstance(values, list):
+            return ids
+        for value in values:
+            if isinstance(value, bool):
+                continue
+            try:
+                pk = int(value)
+            except (TypeError, ValueError):
+                continue
+            if 0 < pk <= MAX_PK_VALUE:
+                ids.add(pk)
+        return ids
+
+    def to_internal_value(self, data):
+        """Загружает ингредиенты и теги рецепта одним запросом на модель."""
+        if not isinstance(data, Mapping):
+            return super().to_internal_value(data)
+        ingredients = data.get('ingredients')
+        if isinstance(ingredients, list):
+            ingredients = [
+                item.get('id') for item in ingredients
+                if isinstance(item, dict)
+            ]
+        self.context['ingredients_by_id'] = Ingredient.objects.in_bulk(
+            self._collect_ids(ingredients)
+        )
+        tags = (
+            data.getlist('tags') if hasattr(data, 'getlist')
+            else data.get('tags')
+        )
+        self.context['tags_by_id'] = Tag.objects.in_bulk(
+            self._collect_ids(tags)
+        )
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def _has_duplicates(values):
+        """Ищет повторы за один проход, останавливаясь на первом."""
+        seen = set()
+        for value in values:
+            if value in seen:
+                return True
+            seen.add(value)
+        return False
+
     def validate(self, data):
         """Общая валидация для создания и обновления."""
         ingredients = data.get('ingredients', [])
@@ -166,8 +298,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'Должен быть хотя бы один ингредиент.'
             })
-        ingredient_ids = [item['id'].id for item in ingredients]
-        if len(ingredient_ids) != len(set(ingredient_ids)):
+        if self._has_duplicates(item['id'].id for item in ingredients):
             raise serializers.ValidationError({
                 'Ингредиенты не должны повторяться.'
             })
@@ -176,8 +307,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'Должен быть хотя бы один тег.'
             })
-        tag_ids = [tag.id for tag in tags]
-        if len(tag_ids) != len(set(tag_ids)):
+        if self._has_duplicates(tag.id for tag in tags):
             raise serializers.ValidationError({
                 'Теги не должны повторяться.'
             })
@@ -195,8 +325,43 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
             for ingredient_data in ingredients_data
         ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=BULK_BATCH_SIZE
+        )
+
+    @classmethod
+    def _update_recipe_ingredients(cls, recipe, ingredients_data):
+        """Обновление ингредиентов рецепта только по изменившимся строкам."""
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        incoming = {
+            ingredient_data['id'].id: ingredient_data
+            for ingredient_data in ingredients_data
+        }
+        to_delete = existing.keys() - incoming.keys()
+        if to_delete:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=to_delete
+            ).delete()
+        to_update = []
+        for ingredient_id in existing.keys() & incoming.keys():
+            recipe_ingredient = existing[ingredient_id]
+            amount = incoming[ingredient_id]['amount']
+            if recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        if to_update:
+            RecipeIngredient.objects.bulk_update(
+                to_update, ('amount',), batch_size=BULK_BATCH_SIZE
+            )
+        cls._create_recipe_ingredients(recipe, [
+            incoming[ingredient_id]
+            for ingredient_id in incoming.keys() - existing.keys()
+        ])
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         ingredients_data = validated_data.pop('ingredients')
@@ -205,48 +370,77 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = super().create(validated_data)
         recipe.tags.set(tags_data)
         self._create_recipe_ingredients(recipe, ingredients_data)
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление рецепта."""
         ingredients_data = validated_data.pop('ingredients', None)
         tags_data = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
         instance.tags.set(tags_data)
-        instance.recipe_ingredients.all().delete()
-        self._create_recipe_ingredients(instance, ingredients_data)
+        self._update_recipe_ingredients(instance, ingredients_data)
 
         return instance
 
     def to_representation(self, instance):
         """Возвращаем данные для чтения после создания/обновления."""
+        if not hasattr(instance, 'is_favorited'):
+            user = self.context['request'].user
+            instance.is_favorited, instance.is_in_shopping_cart = (
+                Recipe.objects.filter(pk=instance.pk).values_list(
+                    Exists(Favorite.objects.filter(
+                        user_id=user.id, recipe_id=OuterRef('pk')
+                    )),
+                    Exists(ShoppingCart.objects.filter(
+                        user_id=user.id, recipe_id=OuterRef('pk')
+                    ))
+                ).get()
+            )
+        prefetch_related_objects(
+            [instance], 'author', 'tags', 'recipe_ingredients__ingredient'
+        )
         return RecipeReadSerializer(instance, context=self.context).data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Краткий сериализатор рецептов для избранного, подписок и т.д."""
 
+    image = ImageUrlField()
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteShoppingCartSerializer(serializers.ModelSerializer):
+class UniqueRelationCreateMixin:
+    """Создание связи с проверкой дублей уникальным ограничением БД."""
+
+    duplicate_error = None
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_error]}
+            )
+
+
+class FavoriteShoppingCartSerializer(
+    UniqueRelationCreateMixin, serializers.ModelSerializer
+):
     """Базовый сериализатор для избранного и корзины покупок."""
 
+    duplicate_error = 'Рецепт уже добавлен.'
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
     class Meta:
         fields = ('user', 'recipe')
-
-    def validate(self, data):
-        """Проверяем, что рецепт еще не добавлен."""
-        user = data['user']
-        recipe = data['recipe']
-        model = self.Meta.model
-
-        if model.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError('Рецепт уже добавлен.')
-        return data
+        validators = []
 
     def to_representation(self, instance):
         """Возвращаем рецепт в кратком формате."""
@@ -273,7 +467,6 @@ class ShoppingCartSerializer(FavoriteShoppingCartSerializer):
 class SubscriptionSerializer(UserSerializer):
     """Сериализатор для отображения подписок."""
 
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta:
@@ -284,57 +477,53 @@ class SubscriptionSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        """Всегда True для подписок."""
-        return True
+        """В списке подписок пользователь подписан на каждого автора."""
+        return getattr(obj, 'is_subscribed', True)
 
-    def get_recipes_count(self, obj):
-        """Подсчитывает количество рецептов автора."""
-        return obj.recipes.count()
+    @cached_property
+    def recipe_serializer(self):
+        """Один сериализатор рецептов на все строки списка подписок."""
+        return RecipeShortSerializer(context=self.context)
 
     def get_recipes(self, obj):
         """Возвращает краткую информацию о рецептах автора."""
-        request = self.context.get('request')
-        recipes = obj.recipes.all()
-
-        if request:
-            try:
-                recipes_limit = int(request.query_params.get('recipes_limit'))
-                recipes = recipes[:recipes_limit]
-            except (TypeError, ValueError):
-                pass
-
-        return RecipeShortSerializer(
-            recipes, many=True, context=self.context
-        ).data
+        recipes = obj.prefetched_recipes
+        recipes_limit = get_recipes_limit(self.context.get('request'))
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return [
+            self.recipe_serializer.to_representation(recipe)
+            for recipe in recipes
+        ]
 
 
-class FollowCreateSerializer(serializers.ModelSerializer):
+class FollowCreateSerializer(
+    UniqueRelationCreateMixin, serializers.ModelSerializer
+):
     """Сериализатор для создания подписок."""
 
+    duplicate_error = 'Вы уже подписаны на этого автора.'
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
     class Meta:
         model = Follow
         fields = ('user', 'author')
+        validators = []
 
     def validate(self, data):
-        """Проверка на самоподписку и дублирование."""
-        user = data.get('user')
-        author = data.get('author')
-
-        if user == author:
+        """Проверка на самоподписку."""
+        if data.get('user') == data.get('author'):
             raise serializers.ValidationError(
                 'Нельзя подписаться на самого себя.'
             )
-        if Follow.objects.filter(user=user, author=author).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого автора.'
-            )
-
         return data
 
     def to_representation(self, instance):
         """Возвращаем данные в формате подписки."""
+        author = instance.author
+        author.prefetched_recipes = author.recipes.all()
         return SubscriptionSerializer(
-            instance.author, context=self.context
+            author, context=self.context
         ).data
 
 
@@ -0,0 +1,108 @@
+import base64
+import io
+import os
+import textwrap
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from .serializers import Base64ImageField, RecipeWriteSerializer
+
+
+User = get_user_model()
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Проверка декодирования изображений из base64."""
+
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(buffer, format='PNG')
+        self.png = buffer.getvalue()
+
+    def decode(self, encoded):
+        upload = Base64ImageField._decode_to_temporary_file(
+            encoded, 0, 'image.bin', 'image/png'
+        )
+        try:
+            return upload.read()
+        finally:
+            upload.close()
+
+    @mock.patch('api.serializers.BASE64_DECODE_CHUNK_SIZE', 7)
+    def test_chunks_carry_incomplete_groups(self):
+        raw = os.urandom(101)
+        self.assertEqual(self.decode(base64.b64encode(raw).decode()), raw)
+
+    @mock.patch('api.serializers.BASE64_DECODE_CHUNK_SIZE', 7)
+    def test_chunks_skip_line_breaks(self):
+        raw = os.urandom(101)
+        wrapped = '\r\n'.join(textwrap.wrap(base64.b64encode(raw).decode()))
+        self.assertEqual(self.decode(wrapped), raw)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_image_goes_through_temporary_file(self):
+        encoded = '\n'.join(textwrap.wrap(base64.b64encode(self.png).decode()))
+        image = Base64ImageField().to_internal_value(
+            f'data:image/png;base64,{encoded}'
+        )
+        image.seek(0)
+        self.assertEqual(image.read(), self.png)
+        self.assertTrue(image.name.endswith('.png'))
+
+
+class RecipeIngredientsUpdateTest(TestCase):
+    """Проверка обновления ингредиентов рецепта по разнице строк."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='author', last_name='author',
+            password='password-12345'
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=1, image='recipes/image.png'
+        )
+        self.kept, self.changed, self.removed, self.added = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука', 'масло')
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in (
+                (self.kept, 1), (self.changed, 2), (self.removed, 3)
+            )
+        )
+
+    def test_update_applies_only_the_difference(self):
+        kept_row = RecipeIngredient.objects.get(ingredient=self.kept)
+        # Выборка текущих строк, удаление, bulk_update и bulk_create.
+        with self.assertNumQueries(4):
+            RecipeWriteSerializer._update_recipe_ingredients(self.recipe, (
+                {'id': self.kept, 'amount': 1},
+                {'id': self.changed, 'amount': 5},
+                {'id': self.added, 'amount': 7},
+            ))
+        self.assertEqual(
+            dict(self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {self.kept.id: 1, self.changed.id: 5, self.added.id: 7}
+        )
+        self.assertEqual(
+            RecipeIngredient.objects.get(ingredient=self.kept).pk,
+            kept_row.pk
+        )
+
+    def test_unchanged_ingredients_skip_writes(self):
+        with self.assertNumQueries(1):
+            RecipeWriteSerializer._update_recipe_ingredients(self.recipe, (
+                {'id': self.kept, 'amount': 1},
+                {'id': self.changed, 'amount': 2},
+                {'id': self.removed, 'amount': 3},
+            ))
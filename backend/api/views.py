@@ -1,29 +1,116 @@
-from django.db.models import Sum
-from django.http import HttpResponse, HttpResponseRedirect
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Prefetch, Sum, Value
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.contrib.auth import get_user_model, update_session_auth_hash
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
+from djoser.compat import get_user_email
+from djoser.conf import settings as djoser_settings
+from djoser.utils import logout_user
 from djoser.views import UserViewSet as DjoserUserViewSet
 
-from .pagination import FoodgramPagination
+from foodgram.constants import (
+    RECIPE_LIST_CACHE_TIMEOUT, RECIPE_LIST_VERSION_KEY,
+    SHOPPING_LIST_CHUNK_SIZE, TAG_LIST_VERSION_KEY
+)
+from .pagination import (
+    FoodgramCursorPagination, FoodgramPagination, RecipePagination
+)
 from .filters import IngredientFilter, RecipeFilter
 from .permissions import RecipePermission, UserPermission
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
 from users.models import Follow
 from .serializers import (
     IngredientSerializer, RecipeReadSerializer, ShoppingCartSerializer,
     RecipeWriteSerializer, TagSerializer, FavoriteSerializer,
-    SubscriptionSerializer, FollowCreateSerializer, AvatarSerializer
+    SubscriptionSerializer, FollowCreateSerializer, AvatarSerializer,
+    get_recipes_limit
 )
 
 
 User = get_user_model()
 
 
+def annotate_is_subscribed(queryset, user):
+    """Добавляет к пользователям отметку подписки текущего пользователя."""
+    return queryset.annotate(
+        is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        )
+    )
+
+
+def validate_relation(serializer, related_field):
+    """Проверяет данные связи, отсутствующий объект превращает в 404."""
+    if not serializer.is_valid():
+        if related_field in serializer.errors:
+            raise NotFound()
+        raise ValidationError(serializer.errors)
+
+
+def get_base_uri(request):
+    """Базовый адрес сайта для ссылок на изображения."""
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+def get_cache_version(request, version_key):
+    """Версия кэша, прочитанная не более одного раза за запрос."""
+    if not hasattr(request, '_cache_versions'):
+        request._cache_versions = {}
+    if version_key not in request._cache_versions:
+        request._cache_versions[version_key] = cache.get_or_set(
+            version_key, time.time_ns, None
+        )
+    return request._cache_versions[version_key]
+
+
+def tags_etag(request, *args, **kwargs):
+    """ETag списка тегов — версия кэша, которую меняют сигналы тегов."""
+    return str(get_cache_version(request, TAG_LIST_VERSION_KEY))
+
+
+def list_cache_key(request, version_key):
+    """Ключ кэша списка для текущей версии и адреса запроса."""
+    version = get_cache_version(request, version_key)
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'{version_key}:{version}:{url}'
+
+
+class CachedListMixin:
+    """Кэширует ответ list до истечения таймаута или смены версии."""
+
+    list_cache_version_key = None
+    list_cache_timeout = None
+
+    def use_list_cache(self, request):
+        """Нужно ли брать ответ на запрос из кэша."""
+        return True
+
+    def list(self, request, *args, **kwargs):
+        """Возвращает список из кэша или сохраняет его туда."""
+        if not self.use_list_cache(request):
+            return super().list(request, *args, **kwargs)
+        cache_key = list_cache_key(request, self.list_cache_version_key)
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, self.list_cache_timeout)
+        return Response(data)
+
+
+@method_decorator(condition(etag_func=tags_etag), name='list')
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
 
@@ -42,16 +129,85 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedListMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
 
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'recipe_ingredients__ingredient'
+    queryset = Recipe.objects.prefetch_related(
+        'tags',
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )
     )
-    pagination_class = FoodgramPagination
+    list_fields = (
+        'id', 'author', 'name', 'image', 'text', 'cooking_time', 'pub_date'
+    )
+    author_fields = (
+        'id', 'email', 'username', 'first_name', 'last_name', 'avatar'
+    )
+    pagination_class = RecipePagination
+    cursor_pagination_class = FoodgramCursorPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     permission_classes = [RecipePermission]
+    list_cache_version_key = RECIPE_LIST_VERSION_KEY
+    list_cache_timeout = RECIPE_LIST_CACHE_TIMEOUT
+
+    @property
+    def paginator(self):
+        """Включает курсорную пагинацию, если передан параметр cursor."""
+        if not hasattr(self, '_paginator'):
+            cursor_param = self.cursor_pagination_class.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """Собирает queryset рецептов один раз за запрос."""
+        if not hasattr(self, '_queryset'):
+            self._queryset = self._build_queryset()
+        return self._queryset
+
+    def _build_queryset(self):
+        """Добавляет отметки избранного и списка покупок одним запросом."""
+        queryset = super().get_queryset()
+        fields = self.list_fields if self.action == 'list' else None
+        user = self.request.user
+        if not user.is_authenticated:
+            queryset = queryset.select_related('author')
+            if fields:
+                queryset = queryset.only(*fields, *(
+                    f'author__{field}' for field in self.author_fields
+                ))
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        if fields:
+            queryset = queryset.only(*fields)
+        authors = User.objects.only(*self.author_fields)
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=annotate_is_subscribed(authors, user))
+        ).annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
+    def use_list_cache(self, request):
+        """Кэширует список только для анонимных пользователей."""
+        return not request.user.is_authenticated
+
+    def get_serializer_context(self):
+        """Добавляет в контекст базовый адрес для ссылок на изображения."""
+        context = super().get_serializer_context()
+        context['base_uri'] = get_base_uri(self.request)
+        return context
 
     def get_serializer_class(self):
         """Подбирает сериализатор для чтения или записи."""
@@ -89,27 +245,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def _add_relation(self, serializer_class, request, pk):
         """Общий метод для добавления связей."""
-        recipe = self.get_object()
         serializer = serializer_class(
-            data={
-                'user': request.user.id,
-                'recipe': recipe.id
-            },
-            context={'request': request}
+            data={'recipe': pk},
+            context=self.get_serializer_context()
         )
-        serializer.is_valid(raise_exception=True)
+        validate_relation(serializer, 'recipe')
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _delete_relation(self, model, request, pk):
         """Общий метод для удаления связей."""
-        recipe = get_object_or_404(Recipe, id=pk)
         deleted_count, _ = model.objects.filter(
             user=request.user,
-            recipe=recipe
+            recipe_id=pk
         ).delete()
 
         if not deleted_count:
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'errors': 'Рецепт не был добавлен.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -124,7 +276,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         """Получить короткую ссылку на рецепт."""
-        recipe = self.get_object()
+        recipe = get_object_or_404(Recipe.objects.only('short_code'), pk=pk)
         short_url = recipe.get_short_url(request)
         return Response({'short-link': short_url})
 
@@ -147,22 +299,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         """Скачать список покупок с сумированием ингредиентов."""
-        shopping_cart = ShoppingCart.objects.filter(user=request.user)
-        ingredients = shopping_cart.values(
-            'recipe__recipe_ingredients__ingredient__name',
-            'recipe__recipe_ingredients__ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('recipe__recipe_ingredients__amount'))
-        shopping_list = ["Список покупок:\n"]
-        for ingredient in ingredients:
-            name = ingredient['recipe__recipe_ingredients__ingredient__name']
-            unit = ingredient[
-                'recipe__recipe_ingredients__ingredient__measurement_unit'
-            ]
-            amount = ingredient['total_amount']
-            shopping_list.append(f"{name} ({unit}) — {amount}")
-
-        response = HttpResponse(
-            '\n'.join(shopping_list), content_type='text/plain'
+        recipe_ids = ShoppingCart.objects.filter(
+            user=request.user
+        ).values('recipe_id')
+        ingredients = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
+
+        def generate_shopping_list():
+            yield "Список покупок:\n"
+            for ingredient in ingredients.iterator(
+                chunk_size=SHOPPING_LIST_CHUNK_SIZE
+            ):
+                name = ingredient['ingredient__name']
+                unit = ingredient['ingredient__measurement_unit']
+                amount = ingredient['total_amount']
+                yield f"\n{name} ({unit}) — {amount}"
+
+        response = StreamingHttpResponse(
+            generate_shopping_list(),
+            content_type='text/plain; charset=utf-8'
         )
         response[
             'Content-Disposition'
@@ -177,6 +335,40 @@ class UserViewSet(DjoserUserViewSet):
     pagination_class = FoodgramPagination
     permission_classes = [UserPermission]
 
+    def get_queryset(self):
+        """Добавляет отметку подписки текущего пользователя."""
+        queryset = super().get_queryset()
+        if self.request.user.is_authenticated:
+            return annotate_is_subscribed(queryset, self.request.user)
+        return queryset
+
+    def get_serializer_context(self):
+        """Добавляет в контекст базовый адрес для ссылок на изображения."""
+        context = super().get_serializer_context()
+        context['base_uri'] = get_base_uri(self.request)
+        return context
+
+    @action(['post'], detail=False)
+    def set_password(self, request, *args, **kwargs):
+        """Смена пароля с обновлением только поля password."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        user.set_password(serializer.data['new_password'])
+        user.save(update_fields=['password'])
+
+        if djoser_settings.PASSWORD_CHANGED_EMAIL_CONFIRMATION:
+            context = {'user': user}
+            to = [get_user_email(user)]
+            djoser_settings.EMAIL.password_changed_confirmation(
+                request, context
+            ).send(to)
+        if djoser_settings.LOGOUT_ON_PASSWORD_CHANGE:
+            logout_user(request)
+        elif djoser_settings.CREATE_SESSION_ON_LOGIN:
+            update_session_auth_hash(request, user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(
         detail=False,
         methods=['get'],
@@ -185,10 +377,20 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         """Список подписок текущего пользователя."""
-        authors = User.objects.filter(following__user=request.user)
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time', 'author'
+        )
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        authors = User.objects.filter(
+            following__user=request.user
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='prefetched_recipes')
+        )
         page = self.paginate_queryset(authors)
         serializer = SubscriptionSerializer(
-            page, many=True, context={'request': request}
+            page, many=True, context=self.get_serializer_context()
         )
         return self.get_paginated_response(serializer.data)
 
@@ -200,24 +402,23 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscribe(self, request, id=None):
         """Подписаться на автора."""
-        author = get_object_or_404(User, id=id)
         serializer = FollowCreateSerializer(
-            data={'user': request.user.id, 'author': author.id},
-            context={'request': request}
+            data={'author': id},
+            context=self.get_serializer_context()
         )
-        serializer.is_valid(raise_exception=True)
+        validate_relation(serializer, 'author')
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, id=None):
         """Отписаться от автора."""
-        author = get_object_or_404(User, id=id)
         deleted_count, _ = Follow.objects.filter(
-            user=request.user, author=author
+            user=request.user, author_id=id
         ).delete()
 
         if not deleted_count:
+            get_object_or_404(User, id=id)
             return Response(
                 {'error': 'Вы не подписаны на этого автора.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -243,6 +444,6 @@ class UserViewSet(DjoserUserViewSet):
         """Удаление аватара."""
         user = request.user
         if user.avatar:
-            user.avatar.delete()
-        user.save()
+            user.avatar.delete(save=False)
+            user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,6 +1,15 @@
 PAGE_SIZE = 6
+PAGE_SIZE_QUERY_PARAM = 'limit'
+PAGE_COUNT_CACHE_TIMEOUT = 60
+RECIPE_LIST_CACHE_TIMEOUT = 60
+RECIPE_LIST_VERSION_KEY = 'recipe-list-version'
+TAG_LIST_VERSION_KEY = 'tag-list-version'
 RECIPE_INGREDIENT_EXTRA = 1
 RECIPE_INGREDIENT_MIN_NUM = 1
+BULK_BATCH_SIZE = 500
+MAX_PK_VALUE = 2 ** 63 - 1
+BASE64_DECODE_CHUNK_SIZE = 64 * 1024
+SHOPPING_LIST_CHUNK_SIZE = 500
 
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32000
@@ -13,5 +22,6 @@ MAX_LENGTH_MEASUREMENT = 64
 MAX_LENGTH_TAG_NAME = 32
 MAX_LENGTH_TAG_SLUG = 32
 MAX_LENGTH_SHORTURL = 6
+SHORT_CODE_ATTEMPTS = 5
 MAX_LENGTH_FIRSTNAME = 150
 MAX_LENGTH_LASTNAME = 150
@@ -12,6 +12,7 @@ class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = RECIPE_INGREDIENT_EXTRA
     min_num = RECIPE_INGREDIENT_MIN_NUM
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Tag)
@@ -33,6 +34,7 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'author', 'cooking_time', 'pub_date')
     list_filter = ('author', 'name', 'tags', 'pub_date')
     search_fields = ('name', 'author__username')
+    list_select_related = ('author',)
     inlines = [RecipeIngredientInline]
     readonly_fields = ('pub_date',)
 
@@ -41,15 +43,18 @@ class RecipeAdmin(admin.ModelAdmin):
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
     list_filter = ('recipe', 'ingredient')
+    list_select_related = ('recipe', 'ingredient')
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     list_filter = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     list_filter = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
@@ -2,7 +2,9 @@ import csv
 import os
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from foodgram.constants import BULK_BATCH_SIZE
 from recipes.models import Ingredient
 
 
@@ -17,16 +19,16 @@ class Command(BaseCommand):
             return
 
         with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file, delimiter=',')
-            count = 0
-
-            for name, unit in reader:
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=name.strip(),
-                    measurement_unit=unit.strip()
-                )
-
-                if created:
-                    count += 1
-
-            print(f'Загружено {count} ингредиентов')
+            ingredients = [
+                Ingredient(name=name.strip(), measurement_unit=unit.strip())
+                for name, unit in csv.reader(file, delimiter=',')
+            ]
+
+        with transaction.atomic():
+            count_before = Ingredient.objects.count()
+            Ingredient.objects.bulk_create(
+                ingredients, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True
+            )
+            count = Ingredient.objects.count() - count_before
+
+        print(f'Загружено {count} ингредиентов')
@@ -0,0 +1,33 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# icontains на PostgreSQL строится как UPPER("name"::text) LIKE UPPER(%s),
+# поэтому GIN-индекс создаётся по тому же выражению. На SQLite индекс
+# не нужен и не создаётся.
+CREATE_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)'
+)
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS ingredient_name_trgm_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_author_pub_date_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,13 +1,14 @@
 import secrets
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
 
 from foodgram.constants import (
     MAX_LENGTH_RECIPES_NAME, MAX_LENGTH_TAG_NAME, MAX_LENGTH_MEASUREMENT,
     MIN_COOKING_TIME, MAX_COOKING_TIME, MIN_AMOUNT, MAX_AMOUNT,
-    MAX_LENGTH_INGREDIENT_NAME, MAX_LENGTH_TAG_SLUG, MAX_LENGTH_SHORTURL
+    MAX_LENGTH_INGREDIENT_NAME, MAX_LENGTH_TAG_SLUG, MAX_LENGTH_SHORTURL,
+    SHORT_CODE_ATTEMPTS
 )
 
 
@@ -129,20 +130,39 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминает автора из базы, чтобы заметить его смену."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        return instance
+
     def save(self, *args, **kwargs):
         """Генерирует короткий код при создании рецепта."""
-        if not self.short_code:
-            while True:
-                code = secrets.token_urlsafe(4)[:6]
-                if not Recipe.objects.filter(short_code=code).exists():
-                    self.short_code = code
-                    break
-
-        super().save(*args, **kwargs)
+        if self.short_code:
+            return super().save(*args, **kwargs)
+        for attempt in range(SHORT_CODE_ATTEMPTS):
+            self.short_code = secrets.token_urlsafe(4)[:MAX_LENGTH_SHORTURL]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == SHORT_CODE_ATTEMPTS - 1:
+                    raise
 
     def get_short_url(self, request):
         """Возвращает полную короткую ссылку."""
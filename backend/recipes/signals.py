@@ -0,0 +1,96 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.constants import RECIPE_LIST_VERSION_KEY, TAG_LIST_VERSION_KEY
+from .models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+
+
+def change_recipes_count(author_id, delta):
+    """Меняет счётчик рецептов автора, не опуская его ниже нуля."""
+    authors = User.objects.filter(pk=author_id)
+    if delta < 0:
+        authors = authors.filter(recipes_count__gte=-delta)
+    authors.update(recipes_count=F('recipes_count') + delta)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(
+    sender, instance, created, raw, update_fields=None, **kwargs
+):
+    """Пересчитывает счётчики при создании рецепта или смене автора."""
+    if raw:
+        return
+    if update_fields is not None and 'author' not in update_fields:
+        return
+    loaded_author_id = getattr(instance, '_loaded_author_id', None)
+    if created:
+        change_recipes_count(instance.author_id, 1)
+    elif loaded_author_id and loaded_author_id != instance.author_id:
+        change_recipes_count(loaded_author_id, -1)
+        change_recipes_count(instance.author_id, 1)
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    """Уменьшает счётчик рецептов автора при удалении рецепта."""
+    change_recipes_count(instance.author_id, -1)
+
+
+class CacheVersionReset:
+    """Отложенная смена версии кэша для transaction.on_commit."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self):
+        cache.set(self.key, time.time_ns(), None)
+
+
+def reset_cache_version(key):
+    """Меняет версию кэша после коммита, не чаще раза за транзакцию."""
+    pending = transaction.get_connection().run_on_commit
+    if any(
+        isinstance(func, CacheVersionReset) and func.key == key
+        for _, func, _ in pending
+    ):
+        return
+    transaction.on_commit(CacheVersionReset(key), robust=True)
+
+
+# Ингредиенты рецепта пишутся через bulk-операции без сигналов. Версия
+# всё равно меняется после коммита, так как рецепт сохраняется в той же
+# транзакции, что и его ингредиенты (в API и в админке).
+@receiver((post_save, post_delete), sender=Recipe)
+def reset_recipe_list_cache(sender, **kwargs):
+    """Сбрасывает кэш списка рецептов при изменении рецептов."""
+    reset_cache_version(RECIPE_LIST_VERSION_KEY)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def reset_recipe_list_cache_on_tags(sender, action, **kwargs):
+    """Сбрасывает кэш списка рецептов после изменения тегов рецепта."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        reset_cache_version(RECIPE_LIST_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def reset_tag_list_cache(sender, **kwargs):
+    """Меняет версию тегов для ETag и сбрасывает кэш рецептов."""
+    reset_cache_version(TAG_LIST_VERSION_KEY)
+    reset_cache_version(RECIPE_LIST_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_recipe_list_cache_on_ingredient(sender, **kwargs):
+    """Сбрасывает кэш рецептов при изменении ингредиентов."""
+    reset_cache_version(RECIPE_LIST_VERSION_KEY)
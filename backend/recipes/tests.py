@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+
+from foodgram.constants import RECIPE_LIST_VERSION_KEY
+
+from .models import Recipe, Tag
+from .signals import CacheVersionReset
+
+
+User = get_user_model()
+
+
+class RecipesCountTest(TestCase):
+    """Проверка денормализованного счётчика рецептов автора."""
+
+    def setUp(self):
+        self.first, self.second = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name, password='password-12345'
+            )
+            for name in ('first', 'second')
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.first, name='Рецепт', text='Описание',
+            cooking_time=1, image='recipes/image.png'
+        )
+
+    def assertRecipesCount(self, user, expected):
+        user.refresh_from_db(fields=('recipes_count',))
+        self.assertEqual(user.recipes_count, expected)
+
+    def test_move_recipe_then_delete(self):
+        self.recipe.author = self.second
+        self.recipe.save()
+        self.assertRecipesCount(self.first, 0)
+        self.assertRecipesCount(self.second, 1)
+
+        self.recipe.delete()
+        self.assertRecipesCount(self.second, 0)
+
+    def test_move_loaded_recipe_without_extra_query(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.author = self.second
+        with self.assertNumQueries(3):
+            recipe.save()
+        self.assertRecipesCount(self.first, 0)
+        self.assertRecipesCount(self.second, 1)
+
+        recipe.save()
+        self.assertRecipesCount(self.second, 1)
+
+    def test_user_save_keeps_recipes_count(self):
+        stale_user = User.objects.get(pk=self.first.pk)
+        Recipe.objects.create(
+            author=self.first, name='Второй', text='Описание',
+            cooking_time=1, image='recipes/image.png'
+        )
+        stale_user.first_name = 'Новое имя'
+        stale_user.save()
+        self.assertRecipesCount(self.first, 2)
+
+        self.recipe.delete()
+        self.assertRecipesCount(self.first, 1)
+
+
+class RecipeListCacheVersionTest(TestCase):
+    """Проверка смены версии кэша списка рецептов."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='author', last_name='author',
+            password='password-12345'
+        )
+        # bulk_create не шлёт сигналов и не ставит смену версии в очередь.
+        (self.tag,) = Tag.objects.bulk_create(
+            (Tag(name='Завтрак', slug='breakfast'),)
+        )
+
+    def test_single_bump_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                recipe = Recipe.objects.create(
+                    author=self.author, name='Рецепт', text='Описание',
+                    cooking_time=1, image='recipes/image.png'
+                )
+                recipe.tags.set((self.tag,))
+                recipe.save()
+        bumps = [
+            callback for callback in callbacks
+            if isinstance(callback, CacheVersionReset)
+            and callback.key == RECIPE_LIST_VERSION_KEY
+        ]
+        self.assertEqual(len(bumps), 1)
+        self.assertIsNotNone(cache.get(RECIPE_LIST_VERSION_KEY))
+
+    def test_no_bump_after_rollback(self):
+        cache.delete(RECIPE_LIST_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Recipe.objects.create(
+                    author=self.author, name='Рецепт', text='Описание',
+                    cooking_time=1, image='recipes/image.png'
+                )
+                transaction.set_rollback(True)
+        self.assertIsNone(cache.get(RECIPE_LIST_VERSION_KEY))
@@ -20,3 +20,4 @@ class FollowAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
     list_filter = ('user', 'author')
     search_fields = ('user__email', 'author__email')
+    list_select_related = ('user', 'author')
@@ -26,6 +26,11 @@ class User(AbstractUser):
         blank=True,
         null=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -38,6 +43,18 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        """Не перезаписывает счётчик рецептов устаревшим значением."""
+        # Счётчик меняют только сигналы рецептов через F(). Полное
+        # сохранение давно загруженного пользователя иначе вернуло бы
+        # в базу старое значение recipes_count.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'recipes_count'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     """Модель для подписок пользователей."""